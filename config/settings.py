@@ -8,6 +8,8 @@ APP_CONFIG = {
     'app_description': 'Complete PDF Management Solution with Interactive Preview',
     'max_file_size': 100 * 1024 * 1024,  # 100MB
     'max_pages_preview': 20,
+    'max_merge_files': 64,
+    'merge_memory_limit': 200 * 1024 * 1024,  # Larger merges parse one source at a time
     'supported_formats': {
         'pdf': ['pdf'],
         'images': ['jpg', 'jpeg', 'png', 'tiff', 'bmp'],
@@ -27,10 +29,13 @@ UI_CONFIG = {
 OCR_CONFIG = {
     'languages': ['eng', 'fra', 'deu', 'spa', 'ita', 'por', 'rus', 'chi_sim', 'jpn', 'kor'],
     'default_language': 'eng',
-    'dpi': 300
+    'dpi': 144,  # OCR render resolution (2x zoom); lowered to the page's own scan resolution
+    'min_dpi': 100
 }
 
 SECURITY_CONFIG = {
+    # Only the standard PDF security handlers are offered: a custom cipher such as
+    # ASCON would produce files that PDF viewers cannot open
     'encryption_methods': ['AES_256', 'AES_128', 'RC4_128'],
     'default_encryption': 'AES_256',
     'permissions': ['print', 'copy', 'annotate', 'form', 'accessibility']
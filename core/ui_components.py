@@ -86,8 +86,9 @@ class UIComponents:
         st.subheader("📄 Select Pages")
         
         try:
-            # Get page previews
-            previews = self.editor.get_all_pages_preview(pdf_file, max_pages or APP_CONFIG['max_pages_preview'])
+            # Thumbnails are only rendered when the page grid is shown
+            max_pages = max_pages or APP_CONFIG['max_pages_preview']
+            page_count = min(self.editor.get_page_count(pdf_file), max_pages)
             
             # Page selection options
             selection_mode = st.radio(
@@ -97,15 +98,16 @@ class UIComponents:
             )
             
             if selection_mode == "All Pages":
-                selected_pages = list(range(1, len(previews) + 1))
+                selected_pages = list(range(1, page_count + 1))
                 session_manager.update_selected_pages(selected_pages)
-                st.success(f"Selected all {len(previews)} pages")
+                st.success(f"Selected all {page_count} pages")
                 
             elif selection_mode == "Specific Pages":
+                previews = self.editor.get_all_pages_preview(pdf_file, max_pages)
                 selected_pages = self._render_thumbnail_selector(previews, session_manager)
                 
             elif selection_mode == "Page Range":
-                selected_pages = self._render_range_selector(previews, session_manager)
+                selected_pages = self._render_range_selector(page_count, session_manager)
             
             return session_manager.get('selected_pages', [])
             
@@ -139,7 +141,7 @@ class UIComponents:
                 
                 # Display thumbnail
                 st.image(
-                    f"data:image/png;base64,{preview['image']}",
+                    preview['image'],
                     caption=f"Page {page_num}",
                     width=100
                 )
@@ -153,13 +155,13 @@ class UIComponents:
         st.write(f"Selected pages: {sorted(selected_pages)}")
         return selected_pages
     
-    def _render_range_selector(self, previews, session_manager):
+    def _render_range_selector(self, page_count, session_manager):
         """Render page range selector"""
         col1, col2 = st.columns(2)
         with col1:
-            start_page = st.number_input("Start Page", min_value=1, max_value=len(previews), value=1)
+            start_page = st.number_input("Start Page", min_value=1, max_value=page_count, value=1)
         with col2:
-            end_page = st.number_input("End Page", min_value=start_page, max_value=len(previews), value=len(previews))
+            end_page = st.number_input("End Page", min_value=start_page, max_value=page_count, value=page_count)
         
         selected_pages = list(range(start_page, end_page + 1))
         session_manager.update_selected_pages(selected_pages)
@@ -178,7 +180,7 @@ class UIComponents:
             
             with col1:
                 st.write("**PDF Preview:**")
-                st.image(f"data:image/png;base64,{preview_img}", caption=f"Page {page_num + 1}", width=600)
+                st.image(preview_img, caption=f"Page {page_num + 1}", width=600)
             
             with col2:
                 st.write("**Position Controls:**")
@@ -262,21 +264,27 @@ class UIComponents:
             
             with col1:
                 st.markdown("#### 📄 Before")
-                st.image(f"data:image/png;base64,{original_preview}", caption="Original", use_column_width=True)
+                st.image(original_preview, caption="Original", use_column_width=True)
             
             with col2:
                 st.markdown("#### ✨ After")
-                st.image(f"data:image/png;base64,{modified_preview}", caption="Modified", use_column_width=True)
+                st.image(modified_preview, caption="Modified", use_column_width=True)
             
         except Exception as e:
             st.error(f"Failed to generate preview: {str(e)}")
     
     def render_success_download(self, data, filename, label, mime_type="application/pdf"):
-        """Render success message with download button"""
+        """Render success message with download button
+        
+        ``data`` may also be a zero-argument callable; it is then only run
+        when the user clicks the button, so the output is not held in memory
+        up front.
+        """
         st.success("✅ Operation completed successfully!")
         st.download_button(
             label=label,
             data=data,
             file_name=filename,
-            mime=mime_type
+            mime=mime_type,
+            on_click="ignore"
         )
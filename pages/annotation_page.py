@@ -64,7 +64,7 @@ def _render_highlight_tool(uploaded_pdf, ui_components, editor):
     with st.expander("📄 Preview Page"):
         try:
             preview_img, page_info = editor.get_pdf_preview(uploaded_pdf, page_number-1)
-            st.image(f"data:image/png;base64,{preview_img}", caption=f"Page {page_number}", width=600)
+            st.image(preview_img, caption=f"Page {page_number}", width=600)
             st.info(f"Page size: {int(page_info['width'])} × {int(page_info['height'])} pts")
         except Exception as e:
             st.error(f"Failed to load preview: {str(e)}")
@@ -189,7 +189,7 @@ def _render_add_watermark_tool(uploaded_pdf, session_manager, ui_components, edi
             uploaded_pdf, 
             preview_page, 
             "watermark", 
-            (watermark_text, font_size, rotation)
+            (watermark_text, font_size, rotation, opacity)
         )
         
         # Apply button
@@ -118,11 +118,13 @@ def _render_text_extraction_tool(ui_components, ocr):
                         )
                     
                     with col2:
+                        # Encode the text only if it is actually downloaded
                         st.download_button(
                             label="📄 Download Text File",
-                            data=result['text_data'],
+                            data=lambda text=result['text']: text.encode('utf-8'),
                             file_name=result['text_filename'],
-                            mime="text/plain"
+                            mime="text/plain",
+                            on_click="ignore"
                         )
                     
                     # Text preview and statistics
@@ -135,6 +137,22 @@ def _render_text_extraction_tool(ui_components, ocr):
                     progress_bar.empty()
                     status_text.empty()
 
+def _display_ocr_results(text, include_confidence=False):
+    """Show the extracted text with basic statistics"""
+    st.write("### 📝 Extracted Text")
+    st.text_area("Extracted text", text, height=300)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Characters", f"{len(text):,}")
+    with col2:
+        st.metric("Words", f"{len(text.split()):,}")
+    with col3:
+        st.metric("Lines", f"{len(text.splitlines()):,}")
+    
+    if include_confidence:
+        st.info("ℹ️ Per-word confidence scores are not available for this extraction")
+
 def _render_searchable_pdf_tool(ui_components, ocr):
     """Render searchable PDF creation tool"""
     st.subheader("🔍 Create Searchable PDF")
@@ -175,7 +193,7 @@ def _render_searchable_pdf_tool(ui_components, ocr):
         if st.button("🔄 Create Searchable PDF", type="primary"):
             with st.spinner("Creating searchable PDF..."):
                 try:
-                    result = ocr.extract_text(uploaded_pdf)
+                    result = ocr.extract_text(uploaded_pdf, high_quality=processing_quality == "High Quality")
                     
                     st.success("✅ Searchable PDF created successfully!")
                     
@@ -184,3 +202,5 @@ def _render_searchable_pdf_tool(ui_components, ocr):
                         result['pdf_filename'],
                         "📥 Download Searchable PDF"
                     )
+                except Exception as e:
+                    st.error(f"❌ Failed to create searchable PDF: {str(e)}")
@@ -1,19 +1,59 @@
 import streamlit as st
 import sys
 import os
+import io
+import hashlib
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import fitz  # PyMuPDF
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from config.settings import APP_CONFIG
 from core.ui_components import UIComponents
 from utils.pdf_editor import PDFEditor
 from utils.pdf_security import PDFSecurity
+from utils.page_ranges import parse_page_list
+
+# Shared by all sessions; kept small to bound memory used by concurrent compressions
+_compress_pool = ThreadPoolExecutor(max_workers=2)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cached_page_count(_data, digest):
+    """Count a PDF's pages once per content instead of on every rerun (keyed on digest)"""
+    doc = fitz.open(stream=_data, filetype="pdf")
+    page_count = doc.page_count
+    doc.close()
+    return page_count
+
+def _get_pdf_bytes(uploaded_pdf):
+    """Return the upload's bytes and digest, read from the widget only once per file"""
+    if st.session_state.get('_pdf_key') != uploaded_pdf.file_id:
+        data = uploaded_pdf.getvalue()
+        st.session_state['_pdf_bytes'] = data
+        st.session_state['_pdf_digest'] = hashlib.blake2b(data, digest_size=16).hexdigest()
+        st.session_state['_pdf_key'] = uploaded_pdf.file_id
+    return st.session_state['_pdf_bytes'], st.session_state['_pdf_digest']
+
+def _get_page_count(uploaded_pdf):
+    """Return the page count of an uploaded PDF"""
+    data, digest = _get_pdf_bytes(uploaded_pdf)
+    return _cached_page_count(data, digest)
+
+@st.cache_resource(show_spinner=False)
+def _get_helpers():
+    """Create the stateless page helpers once per server process"""
+    return UIComponents(), PDFEditor(), PDFSecurity()
+
+def _check_pages(pages_list, page_count):
+    """Reject page numbers outside the document before any PDF work is done"""
+    if pages_list and (min(pages_list) < 1 or max(pages_list) > page_count):
+        raise ValueError(f"Pages must be in 1..{page_count}")
 
 def render():
     """Render the organization tools page"""
-    ui_components = UIComponents()
-    editor = PDFEditor()
-    security = PDFSecurity()
+    ui_components, editor, security = _get_helpers()
     
     st.header("📁 PDF Organization Tools")
     
@@ -46,7 +86,9 @@ def _render_merge_tool(ui_components, editor):
         accept_multiple=True
     )
     
-    if len(uploaded_files) > 1:
+    if len(uploaded_files) > APP_CONFIG['max_merge_files']:
+        st.error(f"❌ Please upload at most {APP_CONFIG['max_merge_files']} files to merge")
+    elif len(uploaded_files) > 1:
         st.info(f"Selected {len(uploaded_files)} files for merging")
         
         st.write("**Merge Order:**")
@@ -56,9 +98,18 @@ def _render_merge_tool(ui_components, editor):
         if st.button("Merge PDFs", type="primary"):
             with st.spinner("Merging PDFs..."):
                 try:
-                    result = editor.merge_pdfs(uploaded_files)
+                    # Identical uploads are parsed once and inserted as often as they appear
+                    unique_files = {}
+                    order = []
+                    for file in uploaded_files:
+                        digest = hashlib.blake2b(file.getvalue(), digest_size=16).digest()
+                        order.append(unique_files.setdefault(digest, (len(unique_files), file))[0])
+                    
+                    files = [file for _, file in unique_files.values()]
+                    one_at_a_time = sum(file.size for file in files) > APP_CONFIG['merge_memory_limit']
+                    # Merge only when the user actually clicks download
                     ui_components.render_success_download(
-                        result,
+                        partial(_build_merged_pdf, editor, [file.getvalue() for file in files], order, one_at_a_time),
                         "merged_document.pdf",
                         "📥 Download Merged PDF"
                     )
@@ -67,6 +118,22 @@ def _render_merge_tool(ui_components, editor):
     else:
         st.warning("Please upload at least 2 PDF files to merge")
 
+def _build_merged_pdf(editor, sources, order, one_at_a_time):
+    """Merge and serialize PDF bytes in the given index order
+    
+    Runs when the download is clicked, on Streamlit's media thread, so it opens
+    and closes its own documents.
+    """
+    if one_at_a_time:
+        merged_doc = editor.merge_documents_one_at_a_time(sources, order)
+    else:
+        merged_doc = editor.merge_documents_deduped([editor.open_pdf(source) for source in sources], order)
+    
+    try:
+        return editor.save_merged(merged_doc)
+    finally:
+        merged_doc.close()
+
 def _render_split_tool(ui_components, editor):
     """Render split PDF tool"""
     st.subheader("Split PDF")
@@ -79,75 +146,70 @@ def _render_split_tool(ui_components, editor):
             ["By Page Numbers", "By Page Ranges", "Equal Parts"]
         )
         
-        if split_method == "By Page Numbers":
-            page_numbers = st.text_input(
-                "Enter page numbers (comma-separated):",
-                placeholder="1,3,5,7"
-            )
+        # Inputs live in a form so typing does not rerun the page on every keystroke
+        with st.form("split_form", clear_on_submit=False):
+            if split_method == "By Page Numbers":
+                split_type = "pages"
+                split_value = st.text_input(
+                    "Enter page numbers (comma-separated):",
+                    placeholder="1,3,5,7"
+                )
             
-            if st.button("Split PDF") and page_numbers:
-                with st.spinner("Splitting PDF..."):
-                    try:
-                        result = editor.split_pdf(uploaded_pdf, "pages", page_numbers)
-                        st.success(f"✅ PDF split into {len(result)} files!")
-                        
-                        for i, file_data in enumerate(result):
-                            st.download_button(
-                                label=f"📥 Download {file_data['filename']}",
-                                data=file_data['data'],
-                                file_name=file_data['filename'],
-                                mime="application/pdf",
-                                key=f"split_{i}"
-                            )
-                    except Exception as e:
-                        st.error(f"❌ Failed to split PDF: {str(e)}")
-        
-        elif split_method == "By Page Ranges":
-            page_ranges = st.text_input(
-                "Enter page ranges (comma-separated):",
-                placeholder="1-3,4-6,7-10"
-            )
+            elif split_method == "By Page Ranges":
+                split_type = "range"
+                split_value = st.text_input(
+                    "Enter page ranges (comma-separated):",
+                    placeholder="1-3,4-6,7-10"
+                )
             
-            if st.button("Split PDF") and page_ranges:
-                with st.spinner("Splitting PDF..."):
-                    try:
-                        result = editor.split_pdf(uploaded_pdf, "range", page_ranges)
-                        st.success(f"✅ PDF split into {len(result)} files!")
-                        
-                        for i, file_data in enumerate(result):
-                            st.download_button(
-                                label=f"📥 Download {file_data['filename']}",
-                                data=file_data['data'],
-                                file_name=file_data['filename'],
-                                mime="application/pdf",
-                                key=f"range_{i}"
-                            )
-                    except Exception as e:
-                        st.error(f"❌ Failed to split PDF: {str(e)}")
-        
-        elif split_method == "Equal Parts":
-            pages_per_part = st.number_input(
-                "Pages per part:",
-                min_value=1,
-                value=1
-            )
+            elif split_method == "Equal Parts":
+                split_type = "equal"
+                split_value = str(st.number_input(
+                    "Pages per part:",
+                    min_value=1,
+                    value=1
+                ))
             
-            if st.button("Split PDF"):
-                with st.spinner("Splitting PDF..."):
-                    try:
-                        result = editor.split_pdf(uploaded_pdf, "equal", str(pages_per_part))
-                        st.success(f"✅ PDF split into {len(result)} files!")
-                        
-                        for i, file_data in enumerate(result):
-                            st.download_button(
-                                label=f"📥 Download {file_data['filename']}",
-                                data=file_data['data'],
-                                file_name=file_data['filename'],
-                                mime="application/pdf",
-                                key=f"equal_{i}"
-                            )
-                    except Exception as e:
-                        st.error(f"❌ Failed to split PDF: {str(e)}")
+            submitted = st.form_submit_button("Split PDF")
+        
+        if submitted and split_value:
+            _plan_split(editor, uploaded_pdf, split_type, split_value)
+        
+        _render_split_downloads(editor, uploaded_pdf)
+
+def _plan_split(editor, uploaded_pdf, split_type, split_value):
+    """Compute the split parts and remember only their page ranges"""
+    with st.spinner("Splitting PDF..."):
+        try:
+            # Each operation opens its own document; documents are not shared
+            doc = editor.open_pdf(_get_pdf_bytes(uploaded_pdf)[0])
+            try:
+                split_ranges = editor.get_split_ranges(doc, split_type, split_value)
+            finally:
+                doc.close()
+            st.session_state['split_ranges'] = (uploaded_pdf.file_id, split_type, split_ranges)
+            if not split_ranges:
+                st.warning("None of the requested pages exist in this PDF")
+        except Exception as e:
+            st.session_state.pop('split_ranges', None)
+            st.error(f"❌ Failed to split PDF: {str(e)}")
+
+def _render_split_downloads(editor, uploaded_pdf):
+    """Render one ZIP download of all split parts; the archive is only built when clicked"""
+    file_id, split_type, split_ranges = st.session_state.get('split_ranges', (None, None, []))
+    if file_id != uploaded_pdf.file_id or not split_ranges:
+        return
+    
+    st.success(f"✅ PDF split into {len(split_ranges)} files!")
+    
+    st.download_button(
+        label=f"📥 Download all {len(split_ranges)} files (ZIP)",
+        data=partial(editor.export_split_zip, _get_pdf_bytes(uploaded_pdf)[0], split_ranges),
+        file_name=f"{os.path.splitext(uploaded_pdf.name)[0]}_split.zip",
+        mime="application/zip",
+        key=f"{split_type}_zip",
+        on_click="ignore"
+    )
 
 def _render_rearrange_tool(ui_components, editor):
     """Render rearrange pages tool"""
@@ -156,17 +218,23 @@ def _render_rearrange_tool(ui_components, editor):
     uploaded_pdf = ui_components.render_file_uploader("Upload PDF to rearrange", ['pdf'])
     
     if uploaded_pdf:
-        new_order = st.text_input(
-            "Enter new page order (comma-separated):",
-            placeholder="3,1,4,2,5",
-            help="Enter page numbers in the order you want them to appear"
-        )
+        page_count = _get_page_count(uploaded_pdf)
+        
+        with st.form("rearrange_form", clear_on_submit=False):
+            new_order = st.text_input(
+                f"Enter new page order (comma-separated, 1-{page_count}):",
+                placeholder="3,1,4,2,5",
+                help="Enter page numbers in the order you want them to appear"
+            )
+            submitted = st.form_submit_button("Rearrange Pages")
         
-        if st.button("Rearrange Pages") and new_order:
+        if submitted and new_order:
             with st.spinner("Rearranging pages..."):
                 try:
-                    order_list = [int(p.strip()) for p in new_order.split(',')]
-                    result = editor.rearrange_pages(uploaded_pdf, order_list)
+                    order_list = parse_page_list(new_order)
+                    _check_pages(order_list, page_count)
+                    pdf_bytes, _ = _get_pdf_bytes(uploaded_pdf)
+                    result = editor.rearrange_pages(io.BytesIO(pdf_bytes), order_list)
                     ui_components.render_success_download(
                         result,
                         f"rearranged_{uploaded_pdf.name}",
@@ -182,16 +250,22 @@ def _render_extract_tool(ui_components, editor):
     uploaded_pdf = ui_components.render_file_uploader("Upload PDF to extract pages from", ['pdf'])
     
     if uploaded_pdf:
-        page_numbers = st.text_input(
-            "Enter page numbers to extract (comma-separated):",
-            placeholder="1,3,5,7"
-        )
+        page_count = _get_page_count(uploaded_pdf)
         
-        if st.button("Extract Pages") and page_numbers:
+        with st.form("extract_form", clear_on_submit=False):
+            page_numbers = st.text_input(
+                f"Enter page numbers to extract (comma-separated, 1-{page_count}):",
+                placeholder="1,3,5,7"
+            )
+            submitted = st.form_submit_button("Extract Pages")
+        
+        if submitted and page_numbers:
             with st.spinner("Extracting pages..."):
                 try:
-                    pages_list = [int(p.strip()) for p in page_numbers.split(',')]
-                    result = editor.extract_pages(uploaded_pdf, pages_list)
+                    pages_list = parse_page_list(page_numbers)
+                    _check_pages(pages_list, page_count)
+                    pdf_bytes, _ = _get_pdf_bytes(uploaded_pdf)
+                    result = editor.extract_pages(io.BytesIO(pdf_bytes), pages_list)
                     ui_components.render_success_download(
                         result,
                         f"extracted_{uploaded_pdf.name}",
@@ -215,16 +289,32 @@ def _render_rotate_tool(ui_components, editor):
         with col2:
             page_selection = st.selectbox("Pages to rotate:", ["All pages", "Specific pages"])
         
-        if page_selection == "Specific pages":
-            page_numbers = st.text_input("Enter page numbers (comma-separated):", placeholder="1,3,5")
-            pages_list = [int(p.strip()) for p in page_numbers.split(',')] if page_numbers else None
-        else:
-            pages_list = None
+        with st.form("rotate_form", clear_on_submit=False):
+            if page_selection == "Specific pages":
+                page_numbers = st.text_input("Enter page numbers (comma-separated):", placeholder="1,3,5")
+            else:
+                page_numbers = ""
+            submitted = st.form_submit_button("Rotate Pages")
         
-        if st.button("Rotate Pages"):
+        if submitted:
+            if page_selection == "Specific pages" and not page_numbers.strip():
+                st.warning("Please enter the page numbers to rotate")
+                return
+            
+            try:
+                if page_selection == "Specific pages":
+                    pages_list = parse_page_list(page_numbers)
+                    _check_pages(pages_list, _get_page_count(uploaded_pdf))
+                else:
+                    pages_list = None
+            except ValueError as e:
+                st.error(f"❌ Failed to rotate pages: {str(e)}")
+                return
+            
             with st.spinner("Rotating pages..."):
                 try:
-                    result = editor.rotate_pages(uploaded_pdf, rotation_angle, pages_list)
+                    pdf_bytes, _ = _get_pdf_bytes(uploaded_pdf)
+                    result = editor.rotate_pages(io.BytesIO(pdf_bytes), rotation_angle, pages_list)
                     ui_components.render_success_download(
                         result,
                         f"rotated_{uploaded_pdf.name}",
@@ -245,22 +335,53 @@ def _render_compress_tool(ui_components, security):
             ["low", "medium", "high", "maximum"]
         )
         
+        job_id = f"{uploaded_pdf.file_id}:{compression_level}"
+        
+        # Only the job for the current upload and level is kept, so results of
+        # earlier runs are not held for the rest of the session
+        previous_job = st.session_state.get('compress_job')
+        if previous_job is not None and previous_job[0] != job_id:
+            previous_job[1].cancel()  # No-op once the job has started
+            del st.session_state['compress_job']
+        
         if st.button("Compress PDF"):
-            with st.spinner("Compressing PDF..."):
-                try:
-                    result = security.compress_pdf(uploaded_pdf, compression_level)
-                    st.success("✅ PDF compressed successfully!")
-                    
-                    # Show compression statistics
-                    info = result['compression_info']
-                    st.info(f"Original size: {info['original_size']:,} bytes")
-                    st.info(f"Compressed size: {info['compressed_size']:,} bytes")
-                    st.info(f"Compression ratio: {info['compression_ratio']}%")
-                    
-                    ui_components.render_success_download(
-                        result['data'],
-                        result['filename'],
-                        "📥 Download Compressed PDF"
-                    )
-                except Exception as e:
-                    st.error(f"❌ Failed to compress PDF: {str(e)}")
+            # Run in the background so reruns and other tools stay responsive
+            st.session_state['compress_job'] = (job_id, _compress_pool.submit(
+                security.compress_pdf, uploaded_pdf, compression_level
+            ))
+        
+        _, future = st.session_state.get('compress_job', (None, None))
+        if future is not None:
+            if future.done():
+                _render_compress_result(ui_components, future)
+            else:
+                _poll_compress_job(future)
+    else:
+        st.session_state.pop('compress_job', None)
+
+@st.fragment(run_every=1)
+def _poll_compress_job(future):
+    """Show a running compression and rerun the page once it has finished"""
+    if future.done():
+        st.rerun()
+    st.info("⏳ Compressing PDF in the background... you can keep using the other tools.")
+
+def _render_compress_result(ui_components, future):
+    """Render the outcome of a finished compression job"""
+    try:
+        result = future.result()
+        st.success("✅ PDF compressed successfully!")
+        
+        # Show compression statistics
+        info = result['compression_info']
+        st.info(f"Original size: {info['original_size']:,} bytes")
+        st.info(f"Compressed size: {info['compressed_size']:,} bytes")
+        st.info(f"Compression ratio: {info['compression_ratio']}%")
+        
+        ui_components.render_success_download(
+            result['data'],
+            result['filename'],
+            "📥 Download Compressed PDF"
+        )
+    except Exception as e:
+        st.error(f"❌ Failed to compress PDF: {str(e)}")
@@ -1,18 +1,37 @@
 import streamlit as st
 import sys
 import os
+import io
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.ui_components import UIComponents
-from utils.pdf_security import PDFSecurity
+from utils.pdf_security import PDFSecurity, HASH_ALGORITHMS
 from config.settings import SECURITY_CONFIG
 
+# (name, checkbox label, PDF permission bit) for each configurable permission
+PERMISSION_OPTIONS = tuple(
+    (perm, perm.replace('_', ' ').title(), PDFSecurity().permission_flags[perm])
+    for perm in SECURITY_CONFIG['permissions']
+)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _cached_security_info(_pdf_bytes, file_id, password=None):
+    """Probe a PDF's security once per (upload, password) instead of on every rerun
+    
+    Keyed on the upload's file_id, so the PDF bytes are not hashed on every call.
+    """
+    return PDFSecurity().check_pdf_security(io.BytesIO(_pdf_bytes), password)
+
+@st.cache_resource(show_spinner=False)
+def _get_helpers():
+    """Create the stateless page helpers once per server process"""
+    return UIComponents(), PDFSecurity()
+
 def render():
     """Render the security tools page"""
-    ui_components = UIComponents()
-    security = PDFSecurity()
+    ui_components, security = _get_helpers()
     
     st.header("🔒 PDF Security Tools")
     
@@ -51,6 +70,13 @@ def _render_add_password_tool(uploaded_pdf, ui_components, security):
         
         if not owner_password:
             st.info("💡 If no owner password is set, user password will be used for both")
+        
+        compression_level = st.selectbox(
+            "Compression",
+            ["none", "low", "medium", "high", "maximum"],
+            index=0,
+            help="Compress the document in the same pass instead of running Compress PDF separately"
+        )
     
     with col2:
         st.write("**Security Settings:**")
@@ -63,9 +89,11 @@ def _render_add_password_tool(uploaded_pdf, ui_components, security):
         
         st.write("**Document Permissions:**")
         permissions = []
-        for perm in SECURITY_CONFIG['permissions']:
-            if st.checkbox(perm.replace('_', ' ').title(), value=perm in ['print', 'copy']):
+        perm_mask = 0
+        for perm, label, flag in PERMISSION_OPTIONS:
+            if st.checkbox(label, value=perm in ['print', 'copy']):
                 permissions.append(perm)
+                perm_mask |= flag
     
     # Security level indicator
     if encryption_method == "AES_256":
@@ -78,10 +106,17 @@ def _render_add_password_tool(uploaded_pdf, ui_components, security):
     if st.button("Add Password Protection", type="primary") and user_password:
         with st.spinner("Adding password protection..."):
             try:
-                result = security.add_password(
-                    uploaded_pdf, user_password, owner_password or None,
-                    encryption_method, permissions
-                )
+                if compression_level == "none":
+                    result = security.add_password(
+                        uploaded_pdf, user_password, owner_password or None,
+                        encryption_method, perm_mask
+                    )
+                else:
+                    result = security.protect_and_compress(
+                        uploaded_pdf, user_password, compression_level,
+                        owner_password=owner_password or None,
+                        encryption_method=encryption_method, permissions=perm_mask
+                    )
                 st.success("✅ Password protection added successfully!")
                 
                 # Show protection details
@@ -108,7 +143,7 @@ def _render_remove_password_tool(uploaded_pdf, ui_components, security):
     
     # Check if PDF is actually protected
     try:
-        security_info = security.check_pdf_security(uploaded_pdf)
+        security_info = _cached_security_info(uploaded_pdf.getvalue(), uploaded_pdf.file_id)
         if not security_info['is_encrypted']:
             st.warning("⚠️ This PDF is not password protected")
             return
@@ -185,7 +220,7 @@ def _render_check_security_tool(uploaded_pdf, ui_components, security):
     if st.button("Check Security", type="primary"):
         with st.spinner("Checking PDF security..."):
             try:
-                result = security.check_pdf_security(uploaded_pdf, password or None)
+                result = _cached_security_info(uploaded_pdf.getvalue(), uploaded_pdf.file_id, password or None)
                 
                 st.success("✅ Security check completed!")
                 
@@ -255,7 +290,7 @@ def _render_compress_tool(uploaded_pdf, ui_components, security):
     
     with col2:
         # Show original file size
-        original_size = len(uploaded_pdf.getvalue())
+        original_size = uploaded_pdf.size
         st.metric("Original File Size", f"{original_size:,} bytes")
         
         # Estimated compression ratios
@@ -295,7 +330,7 @@ def _render_hash_tool(uploaded_pdf, ui_components, security):
     
     hash_algorithm = st.selectbox(
         "Hash Algorithm",
-        ["sha256", "sha1", "md5", "sha512"],
+        list(HASH_ALGORITHMS),
         index=0,
         help="SHA-256 is recommended for security"
     )
@@ -305,7 +340,9 @@ def _render_hash_tool(uploaded_pdf, ui_components, security):
         "sha256": "Secure Hash Algorithm 256-bit (Recommended)",
         "sha1": "Secure Hash Algorithm 160-bit (Legacy)",
         "md5": "Message Digest 5 (Fast, less secure)",
-        "sha512": "Secure Hash Algorithm 512-bit (Most secure)"
+        "sha512": "Secure Hash Algorithm 512-bit (Most secure)",
+        "blake3": "BLAKE3 256-bit (Very fast, secure)",
+        "xxh3_128": "xxHash XXH3 128-bit (Fastest, not for security)"
     }
     st.write(f"**{hash_algorithm.upper()}**: {descriptions[hash_algorithm]}")
     
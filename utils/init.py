@@ -12,6 +12,7 @@ from .pdf_converter import PDFConverter
 from .pdf_editor import PDFEditor
 from .pdf_security import PDFSecurity
 from .ocr_processor import OCRProcessor
+from .page_ranges import parse_page_list, parse_page_ranges
 
 __version__ = "1.0.0"
 __author__ = "PDF Manager Pro Team"
@@ -36,6 +37,8 @@ __all__ = [
     'PDFEditor', 
     'PDFSecurity',
     'OCRProcessor',
+    'parse_page_list',
+    'parse_page_ranges',
     'SUPPORTED_PDF_FORMATS',
     'SUPPORTED_IMAGE_FORMATS',
     'SUPPORTED_OFFICE_FORMATS',
@@ -1,8 +1,11 @@
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
 import fitz  # PyMuPDF
 from PIL import Image
 import pytesseract
 import numpy as np
+from config.settings import OCR_CONFIG
 
 # Try to import cv2, fall back to PIL-only processing if it fails
 try:
@@ -12,49 +15,99 @@ except ImportError:
     CV2_AVAILABLE = False
     print("OpenCV not available, using PIL-only image processing")
 
+# tesserocr keeps a Tesseract instance in-process; fall back to pytesseract's subprocess
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
 class OCRProcessor:
     def __init__(self):
         self.cv2_available = CV2_AVAILABLE
-        pass
+        self.tesserocr_available = TESSEROCR_AVAILABLE
+        self._tess_api = None
+    
+    def image_to_string(self, image):
+        """Run Tesseract on a PIL image or numpy array
+        
+        With tesserocr the language model is loaded once and reused for every call;
+        otherwise pytesseract starts a tesseract process per image.
+        """
+        if not self.tesserocr_available:
+            return pytesseract.image_to_string(image, lang='eng')
+        
+        if self._tess_api is None:
+            self._tess_api = tesserocr.PyTessBaseAPI(lang='eng')
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        self._tess_api.SetImage(image)
+        return self._tess_api.GetUTF8Text()
     
-    def preprocess_image(self, image):
+    def preprocess_image(self, image, high_quality=False):
         """Preprocess image for better OCR results"""
         if self.cv2_available:
             # Use OpenCV for advanced preprocessing
             image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
             gray = cv2.cvtColor(image_cv, cv2.COLOR_BGR2GRAY)
-            denoised = cv2.fastNlMeansDenoising(gray)
-            return Image.fromarray(denoised)
+            return Image.fromarray(self.preprocess_gray(gray, high_quality))
         else:
             # Use PIL for basic preprocessing
             if image.mode != 'L':
                 image = image.convert('L')  # Convert to grayscale
             return image
     
-    def extract_text(self, file):
+    def preprocess_gray(self, gray, high_quality=False):
+        """Preprocess a grayscale numpy image for better OCR results
+        
+        The default light blur plus Otsu binarization is linear in the pixel count;
+        high_quality opts into non-local means denoising, which is far slower but
+        helps on noisy scans.
+        """
+        if not self.cv2_available:
+            return gray
+        if high_quality:
+            return cv2.fastNlMeansDenoising(gray)
+        
+        blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+        _, binarized = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return binarized
+    
+    def extract_text(self, file, high_quality=False):
         """Extract text from PDF or image using OCR"""
         if file.type == "application/pdf":
-            return self.ocr_pdf(file)
+            return self.ocr_pdf(file, high_quality)
         else:
-            return self.ocr_image(file)
+            return self.ocr_image(file, high_quality)
     
-    def ocr_pdf(self, pdf_file):
-        """Perform OCR on PDF file"""
-        doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-        extracted_text = ""
-        
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            
-            # Convert page to image
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-            img_data = pix.tobytes("png")
-            
-            # Perform OCR on image
-            image = Image.open(io.BytesIO(img_data))
-            preprocessed_image = self.preprocess_image(image)
-            page_text = pytesseract.image_to_string(preprocessed_image, lang='eng')
-            extracted_text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
+    def ocr_pdf(self, pdf_file, high_quality=False):
+        """Perform OCR on PDF file, spreading multi-page documents over several threads"""
+        pdf_bytes = pdf_file.read()
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        page_count = len(doc)
+        workers = min(os.cpu_count() or 1, page_count)
+        
+        if workers < 2:
+            page_texts = [self.ocr_page(doc, page_num, high_quality) for page_num in range(page_count)]
+        else:
+            # Tesseract runs outside the GIL (a tesseract process with pytesseract,
+            # released by tesserocr), so threads overlap the recognition without
+            # spawning interpreters; each thread takes a contiguous run of pages
+            page_chunks = [
+                range(worker * page_count // workers, (worker + 1) * page_count // workers)
+                for worker in range(workers)
+            ]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                chunk_texts = list(executor.map(
+                    lambda page_nums: self._ocr_pages(pdf_bytes, page_nums, high_quality),
+                    page_chunks
+                ))
+            page_texts = [page_text for texts in chunk_texts for page_text in texts]
+        
+        extracted_text = "".join(
+            f"\n--- Page {page_num + 1} ---\n{page_text}\n"
+            for page_num, page_text in enumerate(page_texts)
+        )
         
         # Create searchable PDF
         searchable_pdf = self.create_searchable_pdf(doc, extracted_text)
@@ -63,19 +116,55 @@ class OCRProcessor:
             'text': extracted_text,
             'pdf_data': searchable_pdf,
             'pdf_filename': f"searchable_{pdf_file.name}",
-            'text_data': extracted_text.encode('utf-8'),
             'text_filename': f"{pdf_file.name.rsplit('.', 1)[0]}_extracted.txt"
         }
     
-    def ocr_image(self, image_file):
+    def _ocr_pages(self, pdf_bytes, page_nums, high_quality=False):
+        """OCR a run of pages on a private document and Tesseract instance
+        
+        Neither a fitz document nor a tesserocr API may be shared between threads.
+        """
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            processor = OCRProcessor()
+            return [processor.ocr_page(doc, page_num, high_quality) for page_num in page_nums]
+        finally:
+            doc.close()
+    
+    def ocr_page(self, doc, page_num, high_quality=False):
+        """Render one PDF page and return its OCR text"""
+        page = doc.load_page(page_num)
+        
+        zoom = self.get_render_dpi(page) / 72.0
+        
+        # Render straight to grayscale and hand the raw samples over without a PNG round-trip
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+        
+        return self.image_to_string(self.preprocess_gray(gray, high_quality))
+    
+    def get_render_dpi(self, page):
+        """Pick the OCR render DPI, never exceeding the resolution of the page's scanned images"""
+        image_dpi = 0
+        for image in page.get_images(full=True):
+            xref, width = image[0], image[2]
+            for rect in page.get_image_rects(xref):
+                if rect.width > 0:
+                    image_dpi = max(image_dpi, width * 72 / rect.width)
+        
+        if not image_dpi:
+            return OCR_CONFIG['dpi']
+        return max(OCR_CONFIG['min_dpi'], min(OCR_CONFIG['dpi'], image_dpi))
+    
+    def ocr_image(self, image_file, high_quality=False):
         """Perform OCR on image file"""
         image = Image.open(image_file)
         
         # Preprocess image for better OCR
-        preprocessed_image = self.preprocess_image(image)
+        preprocessed_image = self.preprocess_image(image, high_quality)
         
         # Perform OCR
-        extracted_text = pytesseract.image_to_string(preprocessed_image, lang='eng')
+        extracted_text = self.image_to_string(preprocessed_image)
         
         # Create PDF from image with text layer
         pdf_with_text = self.create_pdf_from_image(image, extracted_text)
@@ -84,7 +173,6 @@ class OCRProcessor:
             'text': extracted_text,
             'pdf_data': pdf_with_text,
             'pdf_filename': f"ocr_{image_file.name.rsplit('.', 1)[0]}.pdf",
-            'text_data': extracted_text.encode('utf-8'),
             'text_filename': f"{image_file.name.rsplit('.', 1)[0]}_extracted.txt"
         }
     
@@ -100,11 +188,13 @@ class OCRProcessor:
         pdf_doc = fitz.open()
         page = pdf_doc.new_page(width=image.width, height=image.height)
         
-        # Insert image
-        img_bytes = io.BytesIO()
-        image.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
-        page.insert_image(page.rect, stream=img_bytes.getvalue())
+        # Insert the raw pixels; MuPDF compresses them once when embedding, so a
+        # transient PNG encode/decode would be wasted work
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        colorspace = fitz.csGRAY if image.mode == 'L' else fitz.csRGB
+        pix = fitz.Pixmap(colorspace, image.width, image.height, image.tobytes(), False)
+        page.insert_image(page.rect, pixmap=pix)
         
         # Add invisible text layer (simplified)
         page.insert_text((0, 0), text, fontsize=1, color=(1, 1, 1))
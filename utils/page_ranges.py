@@ -0,0 +1,41 @@
+import re
+
+# A whole page list such as "1, 3-5,8" and the individual "N" / "N-M" items in it
+_PAGE_LIST_RE = re.compile(r"\s*\d+(?:\s*-\s*\d+)?(?:\s*,\s*\d+(?:\s*-\s*\d+)?)*\s*")
+_PAGE_ITEM_RE = re.compile(r"(\d+)(?:\s*-\s*(\d+))?")
+
+def parse_page_ranges(spec):
+    """
+    Parse a comma-separated page list into inclusive (start, end) ranges
+    
+    Single pages ("3") become one-page ranges (3, 3); ranges ("3-7") are kept
+    as given, without expanding them page by page.
+    
+    Args:
+        spec: Page list entered by the user, e.g. "1-3,4-6,9"
+    """
+    if not _PAGE_LIST_RE.fullmatch(spec):
+        raise ValueError(f"Invalid page list: {spec!r}")
+    
+    return [
+        (int(start), int(end) if end else int(start))
+        for start, end in _PAGE_ITEM_RE.findall(spec)
+    ]
+
+def parse_page_list(spec):
+    """
+    Parse a comma-separated page list into a list of 1-indexed page numbers
+    
+    Items may be single pages ("3") or inclusive ranges ("3-7"); order and
+    duplicates are preserved so the result can also describe a page order.
+    
+    Args:
+        spec: Page list entered by the user, e.g. "1,3-5,8"
+    """
+    pages = []
+    for start, end in parse_page_ranges(spec):
+        if start == end:
+            pages.append(start)
+        else:
+            pages.extend(range(start, end + 1))
+    return pages
@@ -1,47 +1,124 @@
 import io
+import re
 from pathlib import Path
+from xml.sax.saxutils import escape
 import fitz  # PyMuPDF
 from PIL import Image
-import pandas as pd
-from docx import Document
-from pptx import Presentation
+import numpy as np
 import zipfile
 import tempfile
 import os
+from itertools import groupby
+from operator import itemgetter
 
-class PDFConverter:
-    def __init__(self):
-        self.supported_formats = {
-            'pdf_to_word': self.pdf_to_word,
-            'pdf_to_excel': self.pdf_to_excel,
-            'pdf_to_powerpoint': self.pdf_to_powerpoint,
-            'pdf_to_images': self.pdf_to_images,
-            'word_to_pdf': self.word_to_pdf,
-            'excel_to_pdf': self.excel_to_pdf,
-            'powerpoint_to_pdf': self.powerpoint_to_pdf,
-            'images_to_pdf': self.images_to_pdf
-        }
+# pandas, python-docx and python-pptx are imported inside the conversions that use
+# them, so pages that never convert Office files do not pay their import cost
+
+# Render transform for pdf_to_images (2x zoom)
+PAGE_IMAGE_MATRIX = fitz.Matrix(2, 2)
+
+# Image formats PyMuPDF can embed as-is in images_to_pdf
+PASSTHROUGH_IMAGE_FORMATS = {'JPEG', 'PNG'}
+
+def _read_pdf_bytes(pdf_file):
+    """Return the whole content of an uploaded PDF without copying it
     
+    getvalue() hands back the upload's own buffer regardless of the stream
+    position, and fitz.open(stream=...) keeps a reference instead of copying.
+    """
+    if hasattr(pdf_file, 'getvalue'):
+        return pdf_file.getvalue()
+    return pdf_file.read()
+
+def _is_gray(pix):
+    """Return True if every pixel of an RGB pixmap has equal red, green and blue values"""
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(-1, 3)
+    red = samples[:, 0]
+    return bool(np.array_equal(red, samples[:, 1]) and np.array_equal(red, samples[:, 2]))
+
+# Characters that are not allowed in XML 1.0 documents
+_XML_INVALID_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Run content that python-docx's Paragraph.text maps to text; str() of each element
+# gives its text equivalent (tab -> "\t", line break -> "\n", ...)
+_DOCX_RUN_CONTENT_XPATH = (
+    '(w:r | w:hyperlink/w:r)/*[self::w:t or self::w:tab or self::w:br or self::w:cr'
+    ' or self::w:noBreakHyphen or self::w:ptab]'
+)
+
+def _docx_paragraph_xml(text):
+    """Return a <w:p> element for text, with line breaks and tabs as python-docx writes them"""
+    text = escape(_XML_INVALID_CHARS_RE.sub('', text))
+    text = text.replace('\t', '</w:t><w:tab/><w:t xml:space="preserve">')
+    text = text.replace('\n', '</w:t><w:br/><w:t xml:space="preserve">')
+    return f'<w:p><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>'
+
+def _passthrough_image(image_file):
+    """Return (width, height, image bytes) if PyMuPDF can embed the upload as-is, else None"""
+    # Opening only parses the header; pixels are decoded on demand
+    img = Image.open(image_file)
+    image_file.seek(0)
+    if img.format in PASSTHROUGH_IMAGE_FORMATS:
+        return img.width, img.height, image_file.read()
+    return None
+
+def _decode_image(image_bytes):
+    """Decode an image to RGB and return (width, height, raw pixel samples)"""
+    img = Image.open(io.BytesIO(image_bytes))
+    
+    # Convert image to RGB if necessary
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img.width, img.height, img.tobytes()
+
+def _try_call(func, arg):
+    """Run func(arg), returning (result, error) so one bad upload does not stop the rest"""
+    try:
+        return func(arg), None
+    except Exception as e:
+        return None, e
+
+class PDFConverter:
     def convert_file(self, uploaded_file, conversion_type):
         """Main conversion dispatcher"""
         conversion_key = conversion_type.lower().replace(' ', '_')
         
-        if conversion_key in self.supported_formats:
-            return self.supported_formats[conversion_key](uploaded_file)
+        convert = self._CONVERSIONS.get(conversion_key)
+        if convert is not None:
+            try:
+                return convert(self, uploaded_file)
+            finally:
+                # MuPDF's store keeps decoded fonts and images after documents are
+                # closed; empty it so memory does not build up across conversions
+                fitz.TOOLS.store_shrink(100)
         else:
             raise ValueError(f"Unsupported conversion type: {conversion_type}")
     
     def pdf_to_word(self, pdf_file):
         """Convert PDF to Word document"""
-        doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+        from docx import Document
+        from docx.oxml import parse_xml
+        from docx.oxml.ns import nsdecls
+        
+        doc = fitz.open(stream=_read_pdf_bytes(pdf_file), filetype="pdf")
         word_doc = Document()
         
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text = page.get_text()
-            word_doc.add_paragraph(text)
-            if page_num < len(doc) - 1:  # Don't add page break after last page
-                word_doc.add_page_break()
+        # Build the WordprocessingML for all pages as one string and parse it once,
+        # instead of going through python-docx for every paragraph
+        paragraphs = []
+        page_count = len(doc)
+        for page_num, page in enumerate(doc):
+            # One paragraph per text block, in reading order (top-to-bottom, left-to-right)
+            for block in page.get_text("blocks", sort=True):
+                if block[6] == 0:  # Skip image blocks
+                    paragraphs.append(_docx_paragraph_xml(block[4].rstrip('\n')))
+            if page_num < page_count - 1:  # Don't add page break after last page
+                paragraphs.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        
+        body = parse_xml(f'<w:body {nsdecls("w")}>{"".join(paragraphs)}</w:body>')
+        section_properties = word_doc.element.body.sectPr
+        for paragraph in list(body):
+            section_properties.addprevious(paragraph)
         
         output = io.BytesIO()
         word_doc.save(output)
@@ -56,40 +133,29 @@ class PDFConverter:
     
     def pdf_to_excel(self, pdf_file):
         """Convert PDF to Excel document"""
-        doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+        from openpyxl import Workbook
         
-        # Create a list to store all text data
-        all_data = []
+        doc = fitz.open(stream=_read_pdf_bytes(pdf_file), filetype="pdf")
         
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text = page.get_text()
-            
-            # Split text into lines and create rows
-            lines = text.split('\n')
-            for line in lines:
-                if line.strip():  # Skip empty lines
-                    # Simple approach: split by spaces or tabs
-                    row_data = line.split()
-                    all_data.append(row_data)
+        # Write-only mode streams rows to the file instead of keeping a cell grid,
+        # so ragged rows need neither padding nor an intermediate DataFrame
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Sheet1")
+        has_data = False
         
-        # Create DataFrame
-        if all_data:
-            # Find the maximum number of columns
-            max_cols = max(len(row) for row in all_data) if all_data else 1
-            
-            # Pad rows to have the same number of columns
-            padded_data = []
-            for row in all_data:
-                padded_row = row + [''] * (max_cols - len(row))
-                padded_data.append(padded_row)
-            
-            df = pd.DataFrame(padded_data)
-        else:
-            df = pd.DataFrame([['No data extracted']])
+        for page in doc:
+            # MuPDF splits the text into words itself; each (block, line) becomes a row,
+            # and words come out already ordered by block, line and word number
+            words = page.get_text("words")
+            for _, line_words in groupby(words, key=itemgetter(5, 6)):
+                sheet.append([word[4] for word in line_words])
+                has_data = True
+        
+        if not has_data:
+            sheet.append(['No data extracted'])
         
         output = io.BytesIO()
-        df.to_excel(output, index=False, header=False)
+        workbook.save(output)
         output.seek(0)
         doc.close()
         
@@ -101,15 +167,16 @@ class PDFConverter:
     
     def pdf_to_powerpoint(self, pdf_file):
         """Convert PDF to PowerPoint presentation"""
-        doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+        from pptx import Presentation
+        
+        doc = fitz.open(stream=_read_pdf_bytes(pdf_file), filetype="pdf")
         ppt = Presentation()
+        slide_layout = ppt.slide_layouts[1]  # Title and Content layout
         
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
+        for page_num, page in enumerate(doc):
             text = page.get_text()
             
             # Create a new slide
-            slide_layout = ppt.slide_layouts[1]  # Title and Content layout
             slide = ppt.slides.add_slide(slide_layout)
             
             # Set title
@@ -133,20 +200,18 @@ class PDFConverter:
     
     def pdf_to_images(self, pdf_file):
         """Convert PDF pages to images"""
-        doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-        images = []
-        
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom
-            img_data = pix.tobytes("png")
-            images.append(img_data)
+        doc = fitz.open(stream=_read_pdf_bytes(pdf_file), filetype="pdf")
         
-        # Create ZIP file with all images
+        # PNG data is already deflated, so store it as-is; each page is written to the
+        # ZIP as soon as it is rendered instead of keeping every page in memory
         zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-            for i, img_data in enumerate(images):
-                zip_file.writestr(f"page_{i+1}.png", img_data)
+        with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zip_file:
+            for page_num, page in enumerate(doc):
+                pix = page.get_pixmap(matrix=PAGE_IMAGE_MATRIX, alpha=False)
+                if _is_gray(pix):
+                    # Text-only and black-and-white scanned pages need a third of the PNG data
+                    pix = fitz.Pixmap(fitz.csGRAY, pix)
+                zip_file.writestr(f"page_{page_num+1}.png", pix.tobytes("png"))
         
         zip_buffer.seek(0)
         doc.close()
@@ -159,6 +224,9 @@ class PDFConverter:
     
     def word_to_pdf(self, word_file):
         """Convert Word document to PDF"""
+        from docx import Document
+        from docx.oxml.ns import qn
+        
         try:
             # Read the Word document
             doc = Document(word_file)
@@ -166,12 +234,12 @@ class PDFConverter:
             # Create a new PDF document
             pdf_doc = fitz.open()
             
-            # Extract text from Word document
-            full_text = []
-            for paragraph in doc.paragraphs:
-                full_text.append(paragraph.text)
-            
-            text_content = '\n'.join(full_text)
+            # Extract text from Word document; one XPath per paragraph selects the same
+            # run content Paragraph.text reads, without building run and hyperlink proxies
+            text_content = '\n'.join(
+                ''.join(map(str, paragraph.xpath(_DOCX_RUN_CONTENT_XPATH)))
+                for paragraph in doc.element.body.iterchildren(qn('w:p'))
+            )
             
             # Create PDF page with text
             page = pdf_doc.new_page()
@@ -196,6 +264,8 @@ class PDFConverter:
     
     def excel_to_pdf(self, excel_file):
         """Convert Excel document to PDF"""
+        import pandas as pd
+        
         try:
             # Read the Excel file
             df = pd.read_excel(excel_file)
@@ -227,6 +297,8 @@ class PDFConverter:
     
     def powerpoint_to_pdf(self, ppt_file):
         """Convert PowerPoint presentation to PDF"""
+        from pptx import Presentation
+        
         try:
             # Read the PowerPoint file
             ppt = Presentation(ppt_file)
@@ -238,13 +310,11 @@ class PDFConverter:
                 # Create a new page for each slide
                 page = pdf_doc.new_page()
                 
-                # Extract text from slide
-                slide_text = []
-                for shape in slide.shapes:
-                    if hasattr(shape, 'text'):
-                        slide_text.append(shape.text)
-                
-                text_content = '\n'.join(slide_text)
+                # Extract text from slide; has_text_frame is a plain property, unlike
+                # hasattr which raises and swallows AttributeError for every other shape
+                text_content = '\n'.join(
+                    shape.text for shape in slide.shapes if shape.has_text_frame
+                )
                 
                 # Add slide title
                 title = f"Slide {slide_num + 1}\n{'='*20}\n"
@@ -275,21 +345,36 @@ class PDFConverter:
         
         pdf_document = fitz.open()
         
-        for image_file in image_files:
+        # JPEG and PNG are embedded as-is; everything else has to be decoded first
+        prepared_images = []
+        pending = {}
+        for index, image_file in enumerate(image_files):
+            prepared, error = _try_call(_passthrough_image, image_file)
+            if prepared is None and error is None:
+                pending[index] = image_file.read()
+            prepared_images.append((prepared, error, 'stream'))
+        
+        if pending:
+            decoded = [_try_call(_decode_image, image_bytes) for image_bytes in pending.values()]
+            
+            for index, (prepared, error) in zip(pending, decoded):
+                prepared_images[index] = (prepared, error, 'samples')
+        
+        # Pages are added in upload order on the one document
+        for image_file, (prepared, error, kind) in zip(image_files, prepared_images):
             try:
-                img = Image.open(image_file)
-                
-                # Convert image to RGB if necessary
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                img_bytes = io.BytesIO()
-                img.save(img_bytes, format='PNG')
-                img_bytes.seek(0)
+                if error is not None:
+                    raise error
+                width, height, data = prepared
                 
                 # Create new page with image dimensions
-                page = pdf_document.new_page(width=img.width, height=img.height)
-                page.insert_image(page.rect, stream=img_bytes.getvalue())
+                page = pdf_document.new_page(width=width, height=height)
+                if kind == 'stream':
+                    page.insert_image(page.rect, stream=data)
+                else:
+                    # Hand the decoded pixels over directly; MuPDF compresses them when embedding
+                    pix = fitz.Pixmap(fitz.csRGB, width, height, data, False)
+                    page.insert_image(page.rect, pixmap=pix)
                 
             except Exception as e:
                 print(f"Error processing image {image_file.name}: {str(e)}")
@@ -305,3 +390,16 @@ class PDFConverter:
             'filename': "converted_images.pdf",
             'mime_type': 'application/pdf'
         }
+    
+    # Conversion type -> plain function, built once with the class rather than
+    # as bound methods on every instance
+    _CONVERSIONS = {
+        'pdf_to_word': pdf_to_word,
+        'pdf_to_excel': pdf_to_excel,
+        'pdf_to_powerpoint': pdf_to_powerpoint,
+        'pdf_to_images': pdf_to_images,
+        'word_to_pdf': word_to_pdf,
+        'excel_to_pdf': excel_to_pdf,
+        'powerpoint_to_pdf': powerpoint_to_pdf,
+        'images_to_pdf': images_to_pdf
+    }
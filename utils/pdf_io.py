@@ -0,0 +1,22 @@
+import os
+import fitz  # PyMuPDF
+
+def pdf_source(pdf_file):
+    """Return fitz.open() keyword arguments for a PDF without copying its content
+    
+    Uploaded files hand over their own buffer through getvalue() (regardless of the
+    stream position), which fitz keeps a reference to; regular files on disk are
+    opened by path so MuPDF reads them itself.
+    """
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return {'stream': pdf_file, 'filetype': "pdf"}
+    if hasattr(pdf_file, 'getvalue'):
+        return {'stream': pdf_file.getvalue(), 'filetype': "pdf"}
+    name = getattr(pdf_file, 'name', None)
+    if isinstance(name, str) and hasattr(pdf_file, 'fileno') and os.path.isfile(name):
+        return {'filename': name}
+    return {'stream': pdf_file.read(), 'filetype': "pdf"}
+
+def open_pdf(pdf_file):
+    """Open an uploaded PDF, PDF bytes or PDF file object as a PyMuPDF document"""
+    return fitz.open(**pdf_source(pdf_file))
@@ -1,13 +1,97 @@
 import io
 import fitz  # PyMuPDF
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.backends import default_backend
 import base64
 import os
 import hashlib
+import inspect
 from datetime import datetime
+from functools import partial
+from utils.pdf_io import open_pdf
+
+# Read size used when hashing without hashlib.file_digest (Python < 3.11)
+HASH_CHUNK_SIZE = 1 << 20
+
+# Newer PyMuPDF releases let Document.save() set the zlib compression effort
+SAVE_HAS_COMPRESSION_EFFORT = 'compression_effort' in inspect.signature(fitz.Document.save).parameters
+
+# BLAKE3 and xxHash are optional, much faster choices for integrity checks
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# Supported file hash algorithms -> hash object factory. MD5 and SHA-1 only serve
+# as checksums here; flagging them as such keeps them available on FIPS-restricted
+# OpenSSL builds
+HASH_ALGORITHMS = {
+    'sha256': partial(hashlib.new, 'sha256'),
+    'sha1': partial(hashlib.new, 'sha1', usedforsecurity=False),
+    'md5': partial(hashlib.new, 'md5', usedforsecurity=False),
+    'sha512': partial(hashlib.new, 'sha512')
+}
+if BLAKE3_AVAILABLE:
+    # Large inputs are hashed on several threads along BLAKE3's tree
+    HASH_ALGORITHMS['blake3'] = partial(blake3.blake3, max_threads=blake3.blake3.AUTO)
+if XXHASH_AVAILABLE:
+    HASH_ALGORITHMS['xxh3_128'] = xxhash.xxh3_128
+
+# (check_pdf_security result key, PDF permission bit)
+PERMISSION_CHECKS = (
+    ('can_print', fitz.PDF_PERM_PRINT),
+    ('can_copy', fitz.PDF_PERM_COPY),
+    ('can_annotate', fitz.PDF_PERM_ANNOTATE),
+    ('can_form', fitz.PDF_PERM_FORM),
+    ('can_accessibility', fitz.PDF_PERM_ACCESSIBILITY),
+    ('can_assemble', fitz.PDF_PERM_ASSEMBLE),
+    ('can_print_hq', fitz.PDF_PERM_PRINT_HQ)
+)
+
+# Document.save() options per compress_pdf level. MuPDF's deflate is a plain on/off
+# switch; the levels differ in what gets compressed and deduplicated. ascii=True is
+# deliberately absent: hex-encoding binary streams roughly doubles their size.
+COMPRESSION_SETTINGS = {
+    "low": {
+        "deflate": True,
+        "deflate_images": False,
+        "garbage": 1
+    },
+    "medium": {
+        "deflate": True,
+        "deflate_images": True,
+        "garbage": 2,
+        "clean": True
+    },
+    "high": {
+        "deflate": True,
+        "deflate_images": True,
+        "garbage": 3,
+        "clean": True,
+        "deflate_fonts": True
+    },
+    "maximum": {
+        "deflate": True,
+        "deflate_images": True,
+        "garbage": 4,
+        "clean": True,
+        "deflate_fonts": True
+    }
+}
+
+def _compression_settings(compression_level):
+    """Return the Document.save() options for a compression level"""
+    settings = COMPRESSION_SETTINGS.get(compression_level, COMPRESSION_SETTINGS["medium"])
+    if compression_level == "maximum" and SAVE_HAS_COMPRESSION_EFFORT:
+        # Full zlib effort costs about the same time here and shrinks text-heavy
+        # content streams by roughly a tenth
+        settings = dict(settings, compression_effort=100)
+    return settings
 
 class PDFSecurity:
     def __init__(self):
@@ -29,7 +113,7 @@ class PDFSecurity:
         }
     
     def add_password(self, pdf_file, user_password, owner_password=None, 
-                    encryption_method='AES_256', permissions=None):
+                    encryption_method='AES_256', permissions=None, compression_level=None):
         """
         Add password protection to PDF with customizable permissions
         
@@ -38,10 +122,11 @@ class PDFSecurity:
             user_password: Password for opening the document
             owner_password: Password for full access (optional)
             encryption_method: Encryption type ('AES_256', 'AES_128', etc.)
-            permissions: List of allowed permissions
+            permissions: List of allowed permissions, or a precomputed PDF_PERM_* bit mask
+            compression_level: compress_pdf level to apply in the same save (optional)
         """
         try:
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+            doc = open_pdf(pdf_file)
             
             if owner_password is None:
                 owner_password = user_password
@@ -51,27 +136,30 @@ class PDFSecurity:
                 permissions = ['print', 'copy', 'annotate']
             
             # Calculate permission flags
-            perm_flags = 0
-            for perm in permissions:
-                if perm in self.permission_flags:
-                    perm_flags |= self.permission_flags[perm]
+            if isinstance(permissions, int):
+                perm_flags = permissions
+            else:
+                perm_flags = 0
+                for perm in permissions:
+                    if perm in self.permission_flags:
+                        perm_flags |= self.permission_flags[perm]
             
             # Get encryption method
             encrypt_method = self.encryption_methods.get(encryption_method, fitz.PDF_ENCRYPT_AES_256)
             
-            output = io.BytesIO()
-            doc.save(
-                output,
+            # Compressing in the same save runs MuPDF's object walk only once
+            save_options = _compression_settings(compression_level) if compression_level else {}
+            protected_data = doc.tobytes(
                 encryption=encrypt_method,
                 user_pw=user_password,
                 owner_pw=owner_password,
-                permissions=perm_flags
+                permissions=perm_flags,
+                **save_options
             )
-            output.seek(0)
             doc.close()
             
             return {
-                'data': output.getvalue(),
+                'data': protected_data,
                 'filename': f"protected_{pdf_file.name}",
                 'encryption_info': {
                     'method': encryption_method,
@@ -83,22 +171,42 @@ class PDFSecurity:
         except Exception as e:
             raise ValueError(f"Failed to add password protection: {str(e)}")
     
+    def protect_and_compress(self, pdf_file, user_password, compression_level='medium', **kwargs):
+        """
+        Compress and password-protect a PDF in a single save
+        
+        Use this instead of chaining compress_pdf and add_password, which would
+        serialize the document twice. Remaining keyword arguments are passed on
+        to add_password.
+        """
+        result = self.add_password(pdf_file, user_password, compression_level=compression_level, **kwargs)
+        result['encryption_info']['compression_level'] = compression_level
+        return result
+    
     def remove_password(self, pdf_file, password):
         """Remove password protection from PDF"""
         try:
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+            pdf_bytes = pdf_file.read()
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+            
+            # Nothing to remove, so hand the file back without rewriting it
+            if not doc.is_encrypted:
+                doc.close()
+                return {
+                    'data': pdf_bytes,
+                    'filename': f"unlocked_{pdf_file.name}",
+                    'status': 'PDF is not password protected'
+                }
             
             if doc.needs_pass:
                 if not doc.authenticate(password):
                     raise ValueError("Incorrect password provided")
             
-            output = io.BytesIO()
-            doc.save(output, encryption=fitz.PDF_ENCRYPT_NONE)
-            output.seek(0)
+            unlocked_data = doc.tobytes(encryption=fitz.PDF_ENCRYPT_NONE)
             doc.close()
             
             return {
-                'data': output.getvalue(),
+                'data': unlocked_data,
                 'filename': f"unlocked_{pdf_file.name}",
                 'status': 'Password removed successfully'
             }
@@ -109,7 +217,7 @@ class PDFSecurity:
     def check_pdf_security(self, pdf_file, password=None):
         """Check PDF security status and permissions"""
         try:
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+            doc = open_pdf(pdf_file)
             
             security_info = {
                 'is_encrypted': doc.is_encrypted,
@@ -125,27 +233,23 @@ class PDFSecurity:
                 security_info['is_authenticated'] = True
             
             if security_info['is_authenticated']:
-                # Get permissions
+                # Get permissions; doc.permissions is read from MuPDF only once
+                permissions = doc.permissions
                 security_info['permissions'] = {
-                    'can_print': doc.permissions & fitz.PDF_PERM_PRINT != 0,
-                    'can_copy': doc.permissions & fitz.PDF_PERM_COPY != 0,
-                    'can_annotate': doc.permissions & fitz.PDF_PERM_ANNOTATE != 0,
-                    'can_form': doc.permissions & fitz.PDF_PERM_FORM != 0,
-                    'can_accessibility': doc.permissions & fitz.PDF_PERM_ACCESSIBILITY != 0,
-                    'can_assemble': doc.permissions & fitz.PDF_PERM_ASSEMBLE != 0,
-                    'can_print_hq': doc.permissions & fitz.PDF_PERM_PRINT_HQ != 0
+                    name: permissions & flag != 0 for name, flag in PERMISSION_CHECKS
                 }
                 
-                # Get metadata
+                # Get metadata; doc.metadata builds a new dict from /Info on every access
+                metadata = doc.metadata or {}
                 security_info['metadata'] = {
                     'page_count': len(doc),
-                    'title': doc.metadata.get('title', ''),
-                    'author': doc.metadata.get('author', ''),
-                    'subject': doc.metadata.get('subject', ''),
-                    'creator': doc.metadata.get('creator', ''),
-                    'producer': doc.metadata.get('producer', ''),
-                    'creation_date': doc.metadata.get('creationDate', ''),
-                    'modification_date': doc.metadata.get('modDate', '')
+                    'title': metadata.get('title', ''),
+                    'author': metadata.get('author', ''),
+                    'subject': metadata.get('subject', ''),
+                    'creator': metadata.get('creator', ''),
+                    'producer': metadata.get('producer', ''),
+                    'creation_date': metadata.get('creationDate', ''),
+                    'modification_date': metadata.get('modDate', '')
                 }
             
             doc.close()
@@ -164,48 +268,17 @@ class PDFSecurity:
             image_quality: JPEG quality for images (1-100)
         """
         try:
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-            
-            # Compression settings based on level
-            compression_settings = {
-                "low": {
-                    "deflate": 1, 
-                    "deflate_images": False,
-                    "garbage": 1
-                },
-                "medium": {
-                    "deflate": 6, 
-                    "deflate_images": True,
-                    "garbage": 2,
-                    "clean": True
-                },
-                "high": {
-                    "deflate": 9, 
-                    "deflate_images": True,
-                    "garbage": 3,
-                    "clean": True,
-                    "sanitize": True
-                },
-                "maximum": {
-                    "deflate": 9,
-                    "deflate_images": True,
-                    "garbage": 4,
-                    "clean": True,
-                    "sanitize": True,
-                    "ascii": True
-                }
-            }
-            
-            settings = compression_settings.get(compression_level, compression_settings["medium"])
+            pdf_bytes = pdf_file.getvalue()
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
             
-            # Get original file size
-            original_size = len(pdf_file.getvalue())
+            settings = _compression_settings(compression_level)
+            original_size = len(pdf_bytes)
             
-            output = io.BytesIO()
-            doc.save(output, **settings)
-            output.seek(0)
-            
-            compressed_data = output.getvalue()
+            # Serialize once; the statistics are derived from the same bytes
+            compressed_data = doc.tobytes(**settings)
+            if len(compressed_data) >= len(pdf_bytes):
+                # Already well compressed; rewriting it would only make it bigger
+                compressed_data = pdf_bytes
             compressed_size = len(compressed_data)
             compression_ratio = (1 - compressed_size / original_size) * 100
             
@@ -228,7 +301,7 @@ class PDFSecurity:
     def add_digital_signature(self, pdf_file, signature_text, position=(100, 100), page_num=0):
         """Add a simple digital signature to PDF"""
         try:
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+            doc = open_pdf(pdf_file)
             
             if page_num < len(doc):
                 page = doc.load_page(page_num)
@@ -243,20 +316,18 @@ class PDFSecurity:
                     full_signature,
                     fontsize=10,
                     color=(0, 0, 1),  # Blue color
-                    fontname="helv-bo"
+                    fontname="hebo"  # Base-14 Helvetica-Bold, referenced rather than embedded
                 )
                 
                 # Add signature box
                 rect = fitz.Rect(position[0]-5, position[1]-15, position[0]+200, position[1]+30)
                 page.draw_rect(rect, color=(0, 0, 1), width=1)
             
-            output = io.BytesIO()
-            doc.save(output)
-            output.seek(0)
+            signed_data = doc.tobytes()
             doc.close()
             
             return {
-                'data': output.getvalue(),
+                'data': signed_data,
                 'filename': f"signed_{pdf_file.name}",
                 'signature_info': {
                     'signer': signature_text,
@@ -277,35 +348,51 @@ class PDFSecurity:
             redaction_areas: List of tuples [(x1, y1, x2, y2), ...]
             page_num: Page number to redact (0-indexed)
         """
+        result = self.redact_pages(pdf_file, {page_num: redaction_areas})
+        result['redaction_info'] = {
+            'areas_redacted': len(redaction_areas),
+            'page': page_num + 1
+        }
+        return result
+    
+    def redact_pages(self, pdf_file, areas_by_page):
+        """
+        Redact areas on several pages, opening and saving the PDF only once
+        
+        Args:
+            pdf_file: Uploaded PDF file
+            areas_by_page: Dict of page number (0-indexed) -> list of tuples
+                [(x1, y1, x2, y2), ...]
+        """
         try:
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+            doc = open_pdf(pdf_file)
             
-            if page_num < len(doc):
+            redacted_pages = []
+            areas_redacted = 0
+            for page_num in sorted(areas_by_page):
+                if not 0 <= page_num < len(doc):
+                    continue
                 page = doc.load_page(page_num)
                 
-                for area in redaction_areas:
-                    x1, y1, x2, y2 = area
-                    rect = fitz.Rect(x1, y1, x2, y2)
-                    
-                    # Add redaction annotation
-                    redact_annot = page.add_redact_annot(rect)
-                    redact_annot.set_colors({"stroke": [0, 0, 0], "fill": [0, 0, 0]})
-                    redact_annot.update()
+                # The fill color is set on creation, so each annotation needs no
+                # separate color update; the black boxes are drawn when applying
+                for area in areas_by_page[page_num]:
+                    page.add_redact_annot(fitz.Rect(area), fill=(0, 0, 0))
                 
-                # Apply redactions
+                # Apply redactions; overlapping image pixels are blanked as before
                 page.apply_redactions()
+                redacted_pages.append(page_num + 1)
+                areas_redacted += len(areas_by_page[page_num])
             
-            output = io.BytesIO()
-            doc.save(output)
-            output.seek(0)
+            redacted_data = doc.tobytes()
             doc.close()
             
             return {
-                'data': output.getvalue(),
+                'data': redacted_data,
                 'filename': f"redacted_{pdf_file.name}",
                 'redaction_info': {
-                    'areas_redacted': len(redaction_areas),
-                    'page': page_num + 1
+                    'areas_redacted': areas_redacted,
+                    'pages': redacted_pages
                 }
             }
             
@@ -315,28 +402,28 @@ class PDFSecurity:
     def generate_file_hash(self, pdf_file, algorithm='sha256'):
         """Generate hash for PDF file integrity verification"""
         try:
-            hash_algorithms = {
-                'md5': hashlib.md5,
-                'sha1': hashlib.sha1,
-                'sha256': hashlib.sha256,
-                'sha512': hashlib.sha512
-            }
-            
-            if algorithm not in hash_algorithms:
+            if algorithm not in HASH_ALGORITHMS:
                 algorithm = 'sha256'
             
-            hash_func = hash_algorithms[algorithm]()
+            new_hash = HASH_ALGORITHMS[algorithm]
             
-            # Read file content
-            content = pdf_file.read()
-            hash_func.update(content)
+            # Stream the file through OpenSSL instead of copying it into one buffer
+            pdf_file.seek(0)
+            if hasattr(hashlib, 'file_digest'):
+                hash_func = hashlib.file_digest(pdf_file, new_hash)
+            else:
+                hash_func = new_hash()
+                while chunk := pdf_file.read(HASH_CHUNK_SIZE):
+                    hash_func.update(chunk)
             
             file_hash = hash_func.hexdigest()
+            file_size = pdf_file.seek(0, io.SEEK_END)
+            pdf_file.seek(0)
             
             return {
                 'hash': file_hash,
                 'algorithm': algorithm,
-                'file_size': len(content),
+                'file_size': file_size,
                 'filename': pdf_file.name
             }
             